@@ -11,9 +11,18 @@ import zlib
 
 from cryptography.hazmat.primitives.serialization import load_ssh_private_key  # type: ignore[attr-defined]
 from cryptography.exceptions import UnsupportedAlgorithm
+from zstandard import ZstdDecompressor
 from requests import Session
 
-from ..shared import QueryResponse, AdminMessage, AdminEC, version
+from ..shared import (
+    QueryResponse,
+    AdminMessage,
+    AdminEC,
+    KEY_HINT_HEADER,
+    ZSTD_MIMETYPE,
+    key_fingerprint,
+    version,
+)
 from .client import Config, UsageError
 
 if TYPE_CHECKING:
@@ -49,16 +58,17 @@ class _Methods:
     All public functions besides 'get' may access self._conf (it will not be None)
     """
 
-    def __init__(self, sign: _Signer, conf: Config) -> None:
+    def __init__(self, sign: _Signer, fingerprint: str, conf: Config) -> None:
         self._log = getLogger(_LOG)
         self._uids: deque[str] = deque()
         self._session = Session()
+        self._session.headers[KEY_HINT_HEADER] = fingerprint
         self._sign = sign
         self._conf = conf
 
     # Helpers
 
-    def _request(self, path: str, body: str = "") -> Response:
+    def _request(self, path: str, body: str = "", headers: dict[str, str] | None = None) -> Response:
         """
         Send a request to the server
         """
@@ -70,7 +80,8 @@ class _Methods:
         self._log.info("Signing request for path=%s with body=%s", path, body)
         msg = AdminMessage(path=path, body=body, uid=uid).bytes()
         data = b"\n".join((bytes(version), b85encode(self._sign(msg)), msg))
-        ret = self._session.post(f"{self._conf.url}{path}", data=data, timeout=ADMIN_REQUEST_TIMEOUT)
+        url = f"{self._conf.url}{path}"
+        ret = self._session.post(url, data=data, headers=headers, timeout=ADMIN_REQUEST_TIMEOUT)
         match ret.status_code:
             case AdminEC.unauthorized:
                 self._log.critical("Admin access denied")
@@ -94,13 +105,19 @@ class _Methods:
 
     # SSL-Protected methods
 
-    def log(self, output_file: Path | None = None) -> None:
+    def log(self, output_file: Path | None = None, raw: bool = False) -> None:
         """
-        Download the server log
+        Download the server log, uncompressed if raw
         """
-        out = zlib.decompress(self._request("/admin/log").content)
+        r = self._request("/admin/log", "raw" if raw else "", headers={"Accept": ZSTD_MIMETYPE})
+        if (content_type := r.headers.get("Content-Type", "")).startswith("text/plain"):
+            out = r.content
+        elif content_type.startswith(ZSTD_MIMETYPE):
+            out = ZstdDecompressor().stream_reader(r.content).read()
+        else:  # Older servers only send zlib
+            out = zlib.decompress(r.content)
         if output_file is None:
-            print(out.decode())
+            print(out.decode().rstrip())
             return
         self._log.info("Writing log to %s", output_file)
         output_file.write_bytes(out)
@@ -156,12 +173,12 @@ class Admin:
         self._ssl: bool = any(i in conf.url for i in ("https", ":443/"))
         if not conf.url or not conf.key_file:
             raise UsageError("Admin mode requires a URL and key-file to be set")
-        self._methods = _Methods(self._load_ssh_key_file(conf.key_file), conf)
+        self._methods = _Methods(*self._load_ssh_key_file(conf.key_file), conf)
 
-    def _load_ssh_key_file(self, key_file: Path) -> _Signer:
+    def _load_ssh_key_file(self, key_file: Path) -> tuple[_Signer, str]:
         """
         Load a private key from a file
-        :return: A function that can sign data using the key file
+        :return: A function that can sign data using the key file, and the fingerprint of its public key
         """
         self._log.info("Extracting private key from %s", key_file)
         if not key_file.exists():
@@ -172,7 +189,7 @@ class Admin:
             raise UsageError(f"Key file {key_file} is not a supported ssh key") from e
         if not hasattr(key, "sign"):
             raise UsageError(f"Key file {key_file} does not support signing")
-        return cast(_Signer, key.sign)
+        return cast(_Signer, key.sign), key_fingerprint(key.public_key())
 
     def __getitem__(self, item: str) -> Callable[..., None]:
         """
@@ -173,6 +173,9 @@ def cli() -> None:
     log_p.add_argument(
         "-o", "--output-file", type=Path, default=None, help="Log output file, instead of stdout"
     )
+    log_p.add_argument(
+        "--raw", action="store_true", help="Download the log uncompressed; useful on fast links"
+    )
     log_lvl_p = admin.add_parser("log-level", help="Get/set the server log level")
     log_lvl_p.add_argument("level", default=None, nargs="?", help="The log level for the server to use")
     admin.add_parser("lock", help="Lock the channel")
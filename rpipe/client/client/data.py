@@ -1,6 +1,6 @@
 from __future__ import annotations
 from dataclasses import dataclass, asdict, fields
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, ClassVar
 from urllib.parse import quote
 from json import loads, dumps
 from logging import getLogger
@@ -144,12 +144,20 @@ class Mode:
     progress: bool | int
     total: bool
     checksum: bool
+    # The names of the priority mode fields above
+    PRIORITY_MODES: ClassVar[tuple[str, ...]] = (
+        "print_config",
+        "save_config",
+        "outdated",
+        "server_version",
+        "query",
+    )
 
     @classmethod
     def keys(cls) -> tuple[str, ...]:
         return tuple(i.name for i in fields(cls))
 
     def priority(self) -> bool:
-        c = (self.print_config, self.save_config, self.outdated, self.server_version, self.query).count(True)
+        c = tuple(getattr(self, i) for i in self.PRIORITY_MODES).count(True)
         assert c <= 1, "Sanity check on priority mode count failed"
         return c > 0
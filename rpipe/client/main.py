@@ -6,10 +6,10 @@ Splitting the CLI into two files does cause a cyclic import
 """
 
 from __future__ import annotations
-from logging import StreamHandler, getLevelName, getLogger
+from logging import Formatter, StreamHandler, getLevelName, getLogger
 from inspect import Parameter, signature
 from typing import TYPE_CHECKING
-from dataclasses import asdict
+from dataclasses import replace
 from os import getenv
 import argparse
 import sys
@@ -57,13 +57,13 @@ def _check_mode_flags(mode: Mode) -> None:
 def _main(raw_ns: Namespace, conf: Config):
     ns = vars(raw_ns)
     # Load Mode
-    mode_d = {i: k for i, k in ns.items() if i in Mode.keys()}
+    mode_d = {i: ns[i] for i in Mode.keys() if i in ns}
     read: bool = sys.stdin.isatty() and not mode_d["delete"]
     mode = Mode(read=read, write=not (read or mode_d["delete"]), **mode_d)
     # Adjustments, error check, then execute
     _check_mode_flags(mode)
     if ns["encrypt"] is None:
-        mode = Mode(**(asdict(mode) | {"encrypt": bool(conf.password)}))
+        mode = replace(mode, encrypt=bool(conf.password))
     if mode.encrypt and not conf.password:
         raise UsageError(f"--encrypt flag requires a password; set via {PASSWORD_ENV}")
     rpipe(conf, mode, ns["config_file"])
@@ -90,11 +90,22 @@ def _config_log(parsed: Namespace) -> None:
     )
 
 
+def _config_min_log() -> None:
+    # Warnings only, with a plain formatter, rather than the full colored setup
+    getLogger().addHandler(sh := StreamHandler())
+    sh.setFormatter(Formatter("%(levelname)s - %(name)s - %(message)s"))
+
+
 # pylint: disable=too-many-locals,too-many-statements
 def main(parser: argparse.ArgumentParser, parsed: Namespace) -> None:
-    _config_log(parsed)
+    # Priority modes just print then exit; only pay for full log setup if verbosity was requested
+    if parsed.verbose or parsed.admin or not any(getattr(parsed, i) for i in Mode.PRIORITY_MODES):
+        _config_log(parsed)
+    else:
+        _config_min_log()
     # Load Config
-    conf_d = {i: k for i, k in vars(parsed).items() if i in Config.keys()}
+    ns = vars(parsed)
+    conf_d = {i: ns[i] for i in Config.keys() if i in ns}
     if (pw := getenv(PASSWORD_ENV)) is not None:
         getLogger(_LOG).debug("Taking password from: %s", PASSWORD_ENV)
         conf_d["password"] = pw
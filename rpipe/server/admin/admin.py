@@ -1,22 +1,45 @@
 from __future__ import annotations
-from logging import getLevelNamesMapping, getLevelName, getLogger
+from logging import DEBUG, getLevelNamesMapping, getLevelName, getLogger
 from typing import TYPE_CHECKING, Any
-from dataclasses import asdict
-from json import loads
 import zlib
 
-from flask import Response
+from zstandard import ZstdCompressor
+from flask import Response, request, send_file
+import orjson
 
-from ...shared import AdminEC
-from ..util import plaintext, json_response
+from ...shared import ZSTD_MIMETYPE, AdminEC
+from ..util import plaintext, json_dumps, json_response
 from .verify import Verify
 
 if TYPE_CHECKING:
+    from collections.abc import Callable, Iterator
     from pathlib import Path
     from ..server import State
 
 
 _UIDS_PER_QUERY: int = 2
+_LOG_CHUNK: int = 0x10000
+
+
+def _compress_file(file: Path) -> Iterator[bytes]:
+    """
+    Lazily zlib compress file, one chunk at a time
+    """
+    c = zlib.compressobj()
+    with file.open("rb") as f:
+        while chunk := f.read(_LOG_CHUNK):
+            if out := c.compress(chunk):
+                yield out
+    yield c.flush()
+
+
+def _zstd_file(file: Path) -> Iterator[bytes]:
+    """
+    Lazily zstd compress file, one chunk at a time
+    """
+    with ZstdCompressor(level=3, threads=-1).stream_reader(file.open("rb")) as r:
+        while chunk := r.read(_LOG_CHUNK):
+            yield chunk
 
 
 class Methods:
@@ -26,6 +49,8 @@ class Methods:
 
     def __init__(self, log_file: Path | None) -> None:
         self._log = getLogger("Admin")
+        self._channels: tuple[int, bytes] | None = None  # The state generation and the body it produced
+        self._levels: dict[str, int] = getLevelNamesMapping()  # Logging is configured (with TRACE) by now
         self._log_file = log_file
         self._log.debug("Log file set to %s", log_file)
 
@@ -33,21 +58,26 @@ class Methods:
     def debug(state: State, _: str) -> Response:
         return plaintext(str(state.debug))
 
-    def log(self, *_) -> Response:
+    def log(self, _: State, body: str) -> Response:
         for i in getLogger().handlers:
             i.flush()
         if self._log_file is None:
             return Response("Missing log file", status=500, mimetype="text/plain")
-        data = zlib.compress(self._log_file.read_bytes().strip())
-        self._log.debug("Sending compressed log of size: %s", len(data))
-        return Response(data, status=200, mimetype="application/octet-stream")
+        if body == "raw":  # Uncompressed, so the WSGI server's file wrapper can send the file as is
+            self._log.debug("Sending raw log")
+            return send_file(self._log_file, mimetype="text/plain", conditional=True, etag=True)
+        if self._log.isEnabledFor(DEBUG):  # Avoid the stat otherwise
+            self._log.debug("Sending compressed log of uncompressed size: %s", self._log_file.stat().st_size)
+        if ZSTD_MIMETYPE in request.accept_mimetypes.values():  # Exact match; older clients send */*
+            return Response(_zstd_file(self._log_file), status=200, mimetype=ZSTD_MIMETYPE)
+        return Response(_compress_file(self._log_file), status=200, mimetype="application/octet-stream")
 
     def log_level(self, state: State, body: str) -> Response:
         root = getLogger()
         new = (old := getLevelName(root.getEffectiveLevel()))
         if body:
             try:
-                new = getLevelName(lvl := int(getLevelNamesMapping().get(body.upper(), body)))
+                new = getLevelName(lvl := int(self._levels.get(body.upper(), body)))
                 self._log.info("Setting log level to %s", new)
                 root.setLevel(lvl)
                 if state.debug:
@@ -59,26 +89,35 @@ class Methods:
 
     @staticmethod
     def stats(state: State, _: str) -> Response:
+        # Stats are mutable and have no cheap snapshot, so serialize them under the lock; orjson is fast
         with state as s:
-            stats = asdict(s.stats)
-        return json_response(stats)
+            body = json_dumps(s.stats)
+        return Response(body, status=200, mimetype="application/json")
 
     def channels(self, state: State, _: str) -> Response:
         """
         Return a list of the server's current channels and stats
         """
         with state as s:
-            output = {i: asdict(k.query()) for i, k in s.streams.items()}
-        return json_response(output)
+            if (cached := self._channels) is not None and cached[0] == state.generation:
+                return Response(cached[1], status=200, mimetype="application/json")
+            # QueryResponses are immutable snapshots, so they may be serialized after releasing the lock
+            generation = state.generation
+            output = {i: k.query() for i, k in s.streams.items()}
+        self._log.debug("Channels changed, rebuilt channel list")
+        self._channels = (generation, body := json_dumps(output))
+        return Response(body, status=200, mimetype="application/json")
 
     def lock(self, state: State, body: str) -> Response:
-        js = loads(body.strip())
-        with state as unlocked:
-            if (s := unlocked.streams.get(channel := js["channel"], None)) is None:
+        js = orjson.loads(body)
+        with state.channel(channel := js["channel"]) as unlocked:
+            if (s := unlocked.streams.get(channel, None)) is None:
                 return Response(f"Channel {channel} not found", status=AdminEC.invalid)
             lock_s = f"{('' if (lock := js['lock']) else 'UN')}LOCKED"
             self._log.info("Setting channel %s to %s", channel, lock_s)
             s.locked = lock
+            if not lock:
+                state.wake_pruner(unlocked.streams.schedule(channel))
         return Response(f"Channel {channel} is now {lock_s}", status=200)
 
 
@@ -90,27 +129,38 @@ class Admin:
     Signed requests must contain a valid signed UID that is only valid for a short period of time
     """
 
-    __slots__ = ("_verify", "_methods")
+    __slots__ = ("_verify", "_methods", "_dispatch")
 
     def __init__(self, log_file: Path, key_files: list[Path]) -> None:
         self._verify = Verify(key_files)
         self._methods = Methods(log_file)
+        names = (i for i in dir(self._methods) if not i.startswith("_"))
+        self._dispatch: dict[str, Callable[[State], Response]] = {i: self._wrap(i) for i in names}
 
-    def __getattr__(self, item: str) -> Any:
+    def _wrap(self, name: str) -> Callable[[State], Response]:
         """
-        Override the getattribute method to wrap most public members with signature verification
+        Wrap the Methods member name with signature verification
         """
-        if item.startswith("_"):
-            raise AttributeError(f"{item} is a private member")
+        fn = getattr(self._methods, name)
 
         def wrapper(state: State) -> Response:
-            assert self._verify is not None, "Admin not initialized"
-            if isinstance(rv := self._verify(item, state), str):
-                return getattr(self._methods, item)(state, rv)
+            if isinstance(rv := self._verify(name, state), str):
+                return fn(state, rv)
             return rv
 
         return wrapper
 
+    def __getattr__(self, item: str) -> Any:
+        """
+        Override the getattribute method to return public Methods members wrapped in signature verification
+        """
+        if item.startswith("_"):
+            raise AttributeError(f"{item} is a private member")
+        try:
+            return self._dispatch[item]
+        except KeyError:
+            raise AttributeError(f"{item} is not an admin method") from None
+
     def uids(self) -> Response:
         """
         Get a few UIDSs that may each be used in a signature to access the server exactly once
@@ -1,38 +1,88 @@
-from datetime import datetime, timedelta
+from collections import deque
 from logging import getLogger
-from threading import RLock
+from threading import Lock
+from time import monotonic_ns
 from os import urandom
 
 
+class _Shard:
+    """
+    A subset of the UIDs
+    The lock must be held to add UIDs or to sweep; a single UID may be claimed with uids.pop without it
+    """
+
+    __slots__ = ("uids", "expiry", "lock")
+
+    def __init__(self) -> None:
+        self.uids: dict[bytes, int] = {}  # Raw UID -> monotonic deadline
+        # Every UID has the same lifetime, so deadlines are added in sorted order
+        self.expiry: deque[tuple[int, bytes]] = deque()
+        self.lock = Lock()  # Nothing here is reentrant
+
+    def sweep(self, now: int) -> None:
+        """
+        Remove expired UIDs, assumes self.lock is held
+        """
+        while self.expiry and self.expiry[0][0] < now:
+            self.uids.pop(self.expiry.popleft()[1], None)
+
+
 class UID:
     """
     A class to manage UIDs that are used for signature verification
+    UIDs are split into shards, each with their own lock, so concurrent admin requests rarely contend
     """
 
-    _UID_EXPIRE: int = 300
+    _UID_EXPIRE: int = 300 * 10**9  # Nanoseconds
     _UID_LEN: int = 32
+    _SHARDS: int = 16
 
     def __init__(self) -> None:
-        self._uids: dict[str, datetime] = {}
+        self._shards = tuple(_Shard() for _ in range(self._SHARDS))
         self._log = getLogger("UID")
-        self._lock = RLock()
+
+    def _shard(self, uid: bytes) -> _Shard:
+        return self._shards[hash(uid) % self._SHARDS]
 
     def new(self, n: int) -> list[str]:
-        ret = [urandom(self._UID_LEN).hex() for i in range(n)]
-        with self._lock:
-            eol = datetime.now() + timedelta(seconds=self._UID_EXPIRE)
-            self._uids.update({i: eol for i in ret})
+        """
+        :return: n new hex encoded UIDs; they are stored as raw bytes, which are cheaper to hash
+        """
+        raw = urandom(n * self._UID_LEN)  # One syscall and hex encode for every UID
+        hexed = raw.hex()
+        ret = [hexed[2 * i : 2 * (i + self._UID_LEN)] for i in range(0, len(raw), self._UID_LEN)]
+        groups: dict[_Shard, list[bytes]] = {}
+        for i in range(0, len(raw), self._UID_LEN):
+            key = raw[i : i + self._UID_LEN]
+            groups.setdefault(self._shard(key), []).append(key)
+        for shard, uids in groups.items():
+            with shard.lock:
+                now = monotonic_ns()
+                shard.sweep(now)
+                eol = now + self._UID_EXPIRE
+                shard.uids.update({i: eol for i in uids})
+                shard.expiry.extend((eol, i) for i in uids)
         self._log.debug("Generated %s new UIDs", n)
         return ret
 
     def verify(self, uid: str) -> bool:
         self._log.debug("Verifying UID: %s", uid)
-        with self._lock:
-            if uid not in self._uids:
-                self._log.error("UID not found: %s", uid)
-                return False
-            if datetime.now() > self._uids.pop(uid):
-                self._log.warning("UID expired: %s", uid)
-                return False
-            self._log.debug("UID verified")
+        try:
+            key = bytes.fromhex(uid)
+        except (TypeError, ValueError):
+            self._log.error("Malformed UID: %s", uid)
+            return False
+        shard = self._shard(key)
+        now = monotonic_ns()
+        # dict.pop is atomic, so a UID can only be claimed once without holding the lock
+        eol = shard.uids.pop(key, None)
+        if shard.lock.acquire(blocking=False):  # Sweeping is not atomic; skip it if another thread is busy
+            try:
+                shard.sweep(now)
+            finally:
+                shard.lock.release()
+        if eol is None or eol < now:
+            self._log.error("UID not found or expired: %s", uid)
+            return False
+        self._log.debug("UID verified")
         return True
@@ -1,25 +1,42 @@
 from __future__ import annotations
 from typing import TYPE_CHECKING, Protocol, cast
-from logging import getLogger
+from logging import DEBUG, INFO, getLogger
 from base64 import b85decode
+from collections import OrderedDict
+from threading import Lock
 from pathlib import Path
-from json import loads
-from time import sleep
+from math import ceil
+from time import monotonic
 
 from cryptography.hazmat.primitives.serialization import load_ssh_public_key
 from cryptography.exceptions import InvalidSignature, UnsupportedAlgorithm
-from flask import request
-
-from ...shared import AdminMessage, AdminStats, AdminEC, Version, remote_addr
+from flask import Response, request
+import orjson
+
+from ...shared import (
+    AdminMessage,
+    AdminStats,
+    AdminEC,
+    KEY_HINT_HEADER,
+    Version,
+    key_fingerprint,
+)
+from ..util import full_path, remote_addr
 from .uid import UID
 
 
 if TYPE_CHECKING:
-    from flask import Response
     from ..server import State
 
 
 MIN_VERSION = Version("8.8.0")
+_BAD_VERSION_MSG: str = f"Minimum supported client version: {MIN_VERSION}"
+_MAX_VERSION_LEN: int = 64  # Longer version strings are rejected and truncated in the admin history
+# Brute force protection: after _FREE_FAILURES recent failures, an address is rejected for a growing backoff
+_FREE_FAILURES: int = 3
+_MAX_BACKOFF: float = 60.0
+_FAILURE_TTL: float = 300.0  # Seconds after which an address's failures are forgotten
+_MAX_TRACKED: int = 1024  # Most addresses whose failures are remembered; the least recent are forgotten first
 
 
 class _Verifier(Protocol):
@@ -31,14 +48,25 @@ class Verify:
     A class to manage signature verification of Admin requests
     """
 
-    __slots__ = ("uid", "_verifiers", "_log")
+    __slots__ = ("uid", "_verifiers", "_hints", "_failures", "_failures_lock", "_log")
 
     def __init__(self, key_files: list[Path]):
         self._log = getLogger("Verify")
         self._log.info("Loading signing keys")
-        verifiers = {self._load_verifier(k): k for k in key_files}
-        _ = verifiers.pop(None, None)
-        self._verifiers = cast(dict[_Verifier, Path], verifiers)
+        self._verifiers: dict[_Verifier, Path] = {}
+        self._hints: dict[str, _Verifier] = {}  # Key fingerprint -> verifier
+        for k in key_files:
+            if (loaded := self._load_verifier(k)) is None:
+                continue
+            if loaded[1] in self._hints:
+                dup = self._verifiers[self._hints[loaded[1]]]
+                self._log.warning("Key file %s duplicates %s - Skipping", k, dup)
+                continue
+            self._verifiers[loaded[0]] = k
+            self._hints[loaded[1]] = loaded[0]
+        # Address -> (failure count, time of last failure), ordered by time of last failure
+        self._failures: OrderedDict[str, tuple[int, float]] = OrderedDict()
+        self._failures_lock = Lock()
         self.uid = UID()
 
     def __call__(self, name: str, state: State) -> Response | str:
@@ -50,24 +78,62 @@ class Verify:
 
     # Private methods
 
-    def _load_verifier(self, key_file: Path) -> _Verifier | None:
+    def _load_verifier(self, key_file: Path) -> tuple[_Verifier, str] | None:
+        """
+        :return: The verify function of the public key in key_file and its fingerprint, or None on failure
+        """
         try:
             if not key_file.exists():
                 self._log.error("Key file %s does not exist", key_file)
                 return None
-            return cast(_Verifier | None, getattr(load_ssh_public_key(key_file.read_bytes()), "verify", None))
+            key = load_ssh_public_key(key_file.read_bytes())
+            if (fn := getattr(key, "verify", None)) is None:
+                return None
+            return cast(_Verifier, fn), key_fingerprint(key)
         except UnsupportedAlgorithm:
             self._log.error("Signature verification is not supported for %s - Skipping", key_file)
             return None
 
-    def _verify_signature(self, signature: bytes, msg: bytes) -> Path | None:
-        self._log.debug("Verifying signature of message: %s", msg)
-        for fn in self._verifiers:
+    def _backoff(self, addr: str) -> float:
+        """
+        Slow down brute force attacks without tying up a request thread
+        :return: The seconds addr must wait before it may try again, or 0 if it may try now
+        """
+        with self._failures_lock:
+            n, when = self._failures.get(addr, (0, 0.0))
+        if n <= _FREE_FAILURES:
+            return 0.0
+        return max(when + min(0.01 * 2 ** (n - _FREE_FAILURES), _MAX_BACKOFF) - monotonic(), 0.0)
+
+    def _failed(self, addr: str) -> None:
+        """
+        Record a failed verification from addr
+        """
+        now = monotonic()
+        with self._failures_lock:
+            n, when = self._failures.pop(addr, (0, 0.0))
+            self._failures[addr] = (1 if now - when >= _FAILURE_TTL else n + 1, now)
+            # Forget the least recent addresses first so this stays bounded and cheap; addr itself is kept
+            oldest = lambda: next(iter(self._failures.values()))[1]
+            while len(self._failures) > _MAX_TRACKED or now - oldest() >= _FAILURE_TTL:
+                self._failures.popitem(last=False)
+
+    def _verify_signature(self, signature: bytes, msg: bytes, hint: str | None) -> Path | None:
+        """
+        If hint names a known key, only that key is tried
+        Otherwise every key is tried, most recent signer first
+        """
+        if self._log.isEnabledFor(DEBUG):
+            self._log.debug("Verifying signature of message: %s", msg)
+        fns = self._verifiers if hint is None or (fn := self._hints.get(hint, None)) is None else (fn,)
+        for fn in fns:
             try:
                 fn(signature, data=msg)
-                return self._verifiers[fn]
             except InvalidSignature:
-                pass
+                continue
+            if next(iter(self._verifiers)) is not fn:  # Try recent signers first; replace rather than mutate
+                self._verifiers = {fn: self._verifiers[fn]} | self._verifiers
+            return self._verifiers[fn]
         return None
 
     def _verify(self, name: str, state: State) -> Response | str:
@@ -76,27 +142,40 @@ class Verify:
             s.stats.admin.append(stat)
         # Check version
         self._log.debug("Checking version")
-        version, post = request.get_data().split(b"\n", 1)
-        stat.version = version.decode()
-        if Version(version) < MIN_VERSION:
-            _msg = f"Minimum supported client version: {MIN_VERSION}"
-            return Response(_msg, status=AdminEC.illegal_version)
+        # Format: version \n signature \n message; find the separators rather than splitting twice
+        raw = request.get_data()
+        if (nl2 := raw.find(b"\n", (nl1 := raw.find(b"\n")) + 1)) < 0:
+            return Response("Malformed admin request", status=AdminEC.invalid)
+        # Unauthenticated and unbounded: long versions are rejected unparsed and only a prefix is kept
+        stat.version = (v := raw[:nl1].decode())[:_MAX_VERSION_LEN]
+        if len(v) > _MAX_VERSION_LEN or Version(v) < MIN_VERSION:
+            return Response(_BAD_VERSION_MSG, status=AdminEC.illegal_version)
         # Extract parameters
         self._log.info("Extracting request signature and message")
-        signature, msg_bytes = post.split(b"\n", 1)
-        msg = AdminMessage(**loads(msg_bytes.decode()))
+        signature, msg_bytes = raw[nl1 + 1 : nl2], raw[nl2 + 1 :]
+        msg = AdminMessage(**orjson.loads(msg_bytes))
         stat.uid = msg.uid
+        # Refuse addresses in backoff before they can consume a UID or a verification attempt
+        # Key on the peer address: waitress only resolves it from headers sent by a --trusted-proxy
+        if (wait := self._backoff(addr := str(request.remote_addr))) > 0:
+            self._log.warning("Rejecting request from %s in backoff for %.2f more seconds", addr, wait)
+            return Response(status=AdminEC.backoff, headers={"Retry-After": str(ceil(wait))})
         # Verify UID
-        sleep(0.01)  # Slow down brute force attacks
         if not self.uid.verify(msg.uid):
             self._log.warning("Rejecting request due to invalid UID: %s", msg.uid)
+            self._failed(addr)
             return Response(status=AdminEC.unauthorized)
         stat.uid_valid = True
         # Verify signature
-        if (key_file := self._verify_signature(b85decode(signature), msg_bytes)) is None:
+        hint = request.headers.get(KEY_HINT_HEADER, None)
+        if (key_file := self._verify_signature(b85decode(signature), msg_bytes, hint)) is None:
             self._log.warning("Signature verification failed.")
+            self._failed(addr)
             return Response(status=AdminEC.unauthorized)
         stat.signer = key_file
+        with self._failures_lock:
+            self._failures.pop(addr, None)
         # Success
-        self._log.info("Signature verified. Executing %s", request.full_path.strip("?"))
+        if self._log.isEnabledFor(INFO):
+            self._log.info("Signature verified. Executing %s", full_path())
         return msg.body
@@ -1,24 +1,48 @@
 from __future__ import annotations
-from logging import DEBUG, INFO, StreamHandler, FileHandler, getLevelName, getLogger, shutdown
+from logging import DEBUG, INFO, ERROR, StreamHandler, FileHandler, Handler, getLevelName, getLogger, shutdown
+from logging.handlers import MemoryHandler, QueueHandler, QueueListener
 from os import environ, close as fd_close
 from dataclasses import dataclass
+from mimetypes import guess_type
 from tempfile import mkstemp
 from functools import wraps
+from threading import Event
+from queue import SimpleQueue, Empty
+from hashlib import sha256
 from pathlib import Path
 import atexit
 
-from flask import Response, Flask, send_file, request
+from flask import Response, Flask, request
 from zstdlib.log import CuteFormatter
-import waitress
 
-from ..shared import TRACE, restrict_umask, remote_addr, log, __version__
-from .util import MAX_SIZE_HARD, MIN_VERSION, json_response, plaintext
-from .channel import handler, query
-from .server import Server
+from ..shared import TRACE, restrict_umask, log, __version__
+from .util import MAX_SIZE_HARD, MIN_VERSION, OrJSONProvider, json_dumps, full_path, plaintext, remote_addr
+from .channel import handler, delete, query, read, write
+from .server import Server, ServerShutdown
 from .admin import Admin
 
 
 _LOG = "app"
+_PROXY_HEADERS = {"x-forwarded-for", "x-forwarded-proto"}
+_LOGGER = getLogger(_LOG)
+_LOG_BUFFER: int = 1024  # Max log records to buffer before writing them to the log file
+_FAVICON_MAX_AGE: int = 365 * 24 * 60 * 60
+
+# Static response bodies, encoded once
+_NOT_FOUND: bytes = b"404: Not found"
+_VERSION: bytes = __version__.encode()
+_SUPPORTED: bytes = json_dumps({"min": MIN_VERSION, "banned": []})
+_HELP: bytes = (
+    b"Welcome to the web UI of rpipe. "
+    b"To interact with a given channel, use the path /c/<channel>. "
+    b"To read a message from a given channel, use a GET request. "
+    b"To write a message to a given channel, use PUT and POST requests. "
+    b"To delete a channel, use a DELETE request. "
+    b"Note: Using the web version bypasses version consistent checks "
+    b"and may result in safe but unexpected behavior (such as failing "
+    b"an uploaded message; if possible use the rpipe client CLI instead. "
+    b"Install the CLI via: pip install rpipe"
+)
 
 
 @dataclass(frozen=True, slots=True, kw_only=True)
@@ -36,42 +60,122 @@ class ServerConfig:
     debug: bool
     state_file: Path | None
     key_files: list[Path]
+    threads: int
+    trusted_proxy: str | None
+
+
+class _QueueListener(QueueListener):
+    """
+    A QueueListener that flushes its handlers whenever the queue is empty
+    It sets any Event it dequeues, so callers can wait for it to catch up
+    """
+
+    def _flush(self) -> None:
+        for i in self.handlers:
+            i.flush()
+
+    def dequeue(self, block: bool):
+        try:
+            return self.queue.get_nowait()
+        except Empty:  # Idle, so write out anything buffered before waiting for more
+            self._flush()
+            return self.queue.get(block)
+
+    def handle(self, record) -> None:
+        if isinstance(record, Event):
+            self._flush()
+            record.set()
+        else:
+            super().handle(record)
+
+
+class _QueueHandler(QueueHandler):
+    """
+    A QueueHandler that owns the QueueListener writing its records to handlers
+    Flushing waits until every record queued so far has been written; closing stops the listener
+    """
+
+    def __init__(self, *handlers: Handler) -> None:
+        super().__init__(SimpleQueue())
+        self._listener = _QueueListener(self.queue, *handlers, respect_handler_level=True)
+        self._running = False
+
+    def start(self) -> None:
+        with self.lock:
+            self._listener.start()
+            self._running = True
+
+    def flush(self) -> None:
+        if self._running:
+            self.queue.put_nowait(done := Event())
+            done.wait()
+
+    def close(self) -> None:
+        with self.lock:
+            if self._running:
+                self._running = False
+                self._listener.stop()
+        super().close()
 
 
 class App(Flask):
+    json_provider_class = OrJSONProvider
+
+    @dataclass(frozen=True, slots=True)
+    class Favicon:
+        data: bytes
+        mimetype: str
+        etag: str
 
     @dataclass(frozen=True, slots=True)
     class Objs:
         admin: Admin
         server: Server
-        favicon: Path | None
+        favicon: App.Favicon | None
 
     def __init__(self) -> None:
         super().__init__(f"rpipe_server {__version__}")
-        getLogger(_LOG).info("Setting max packet size: %s", log.LFS(MAX_SIZE_HARD))
+        _LOGGER.info("Setting max packet size: %s", log.LFS(MAX_SIZE_HARD))
         self.config["MAX_CONTENT_LENGTH"] = MAX_SIZE_HARD
         self.url_map.strict_slashes = False
 
     def start(self, conf: ServerConfig, log_file: Path, favicon: Path | None):
-        lg = getLogger(_LOG)
+        icon: App.Favicon | None = None
         if favicon is not None and not favicon.is_file():
-            lg.error("Favicon file not found: %s", favicon)
-            favicon = None
+            _LOGGER.error("Favicon file not found: %s", favicon)
+        elif favicon is not None:  # The favicon never changes, so load it once
+            data = favicon.read_bytes()
+            mimetype = guess_type(favicon.name)[0] or "image/x-icon"
+            icon = self.Favicon(data, mimetype, sha256(data).hexdigest())
         admin = Admin(log_file, conf.key_files)
-        lg.info("Starting server version: %s", __version__)
+        _LOGGER.info("Starting server version: %s", __version__)
         # pylint: disable=attribute-defined-outside-init
-        self._objs = self.Objs(admin, Server(conf.debug, conf.state_file), favicon)
-        lg.info("Binding to %s:%s", conf.host, conf.port)
+        self._objs = self.Objs(admin, Server(conf.debug, conf.state_file), icon)
+        _LOGGER.info("Binding to %s:%s", conf.host, conf.port)
         if conf.debug:
             self.run(host=conf.host, port=conf.port, debug=True)
         else:
-            waitress.serve(self, host=conf.host, port=conf.port, clear_untrusted_proxy_headers=False)
+            proxy: dict = {}
+            if conf.trusted_proxy is not None:
+                _LOGGER.info("Trusting forwarded headers from proxy: %s", conf.trusted_proxy)
+                proxy = {"trusted_proxy": conf.trusted_proxy, "trusted_proxy_headers": _PROXY_HEADERS}
+            _LOGGER.info("Serving requests with %d threads", conf.threads)
+            # pylint: disable=import-outside-toplevel
+            import waitress  # Not needed in debug mode
+
+            waitress.serve(
+                self,
+                host=conf.host,
+                port=conf.port,
+                threads=conf.threads,
+                clear_untrusted_proxy_headers=False,
+                **proxy,
+            )
 
     def give(self, *, objs: bool = False, logged: bool = True):
         """
         Give the wrapped function self.objs and log requests as requested
         """
-        lg = getLogger(_LOG)
 
         def decorator(func):
             @wraps(func)
@@ -80,11 +184,11 @@ class App(Flask):
                 if not logged or self._objs.server.state.debug:
                     return ret
                 # Release mode: Log the request before returning it, Flask in debug mode does automatically
-                quiet = ret.status_code == 404 and request.full_path.strip("?") == "/favicon.ico"
+                quiet = ret.status_code == 404 and full_path() == "/favicon.ico"
                 lvl = DEBUG if (quiet or ret.status_code in (410, 425) or ret.status_code < 300) else INFO
-                lvl = TRACE if request.method in ("OPTIONS", "HEAD") else lvl
-                args = (remote_addr(), request.method, request.full_path.strip("?"), ret.status_code)
-                lg.log(lvl, '%s - "%s %s" %d', *args)
+                lvl = TRACE if (method := request.method) in ("OPTIONS", "HEAD") else lvl
+                args = (remote_addr(), method, full_path(), ret.status_code)
+                _LOGGER.log(lvl, '%s - "%s %s" %d', *args)
                 return ret
 
             return inner
@@ -123,47 +227,66 @@ app = App()
 @app.errorhandler(404)
 @app.give()
 def _page_not_found(_, *, quiet=False) -> Response:
-    lg = getLogger(_LOG)
     if not quiet:
-        lg.warning("404: Not found: %s", request.path)
-    (lg.debug if quiet else lg.info)("Headers: %s", request.headers)
-    return Response("404: Not found", status=404)
+        _LOGGER.warning("404: Not found: %s", request.path)
+    (_LOGGER.debug if quiet else _LOGGER.info)("Headers: %s", request.headers)
+    return Response(_NOT_FOUND, status=404)
+
+
+@app.errorhandler(ServerShutdown)
+@app.give()
+def _server_shutdown(_) -> Response:
+    _LOGGER.warning("Ignoring request, server is shutting down")
+    return plaintext("Server is shutting down", status=503)
 
 
 @app.route("/", "/help")
 def _help() -> Response:
-    msg = (
-        "Welcome to the web UI of rpipe. "
-        "To interact with a given channel, use the path /c/<channel>. "
-        "To read a message from a given channel, use a GET request. "
-        "To write a message to a given channel, use PUT and POST requests. "
-        "To delete a channel, use a DELETE request. "
-        "Note: Using the web version bypasses version consistent checks "
-        "and may result in safe but unexpected behavior (such as failing "
-        "an uploaded message; if possible use the rpipe client CLI instead. "
-        "Install the CLI via: pip install rpipe"
-    )
-    return plaintext(msg)
+    return plaintext(_HELP)
 
 
 @app.route("/favicon.ico", objs=True, logged=False)
 def _favicon(o: App.Objs) -> Response:
-    return _page_not_found(404, quiet=True) if o.favicon is None else send_file(o.favicon)
+    if (icon := o.favicon) is None:
+        return _page_not_found(404, quiet=True)
+    ret = Response(icon.data, mimetype=icon.mimetype)
+    ret.set_etag(icon.etag)
+    ret.cache_control.public = True
+    ret.cache_control.max_age = _FAVICON_MAX_AGE
+    ret.cache_control.immutable = True
+    return ret.make_conditional(request)
 
 
 @app.route("/version")
 def _show_version() -> Response:
-    return plaintext(__version__)
+    return plaintext(_VERSION)
 
 
 @app.route("/supported")
 def _supported() -> Response:
-    return json_response({"min": str(MIN_VERSION), "banned": []})
+    return Response(_SUPPORTED, status=200, mimetype="application/json")
+
 
+# Each method has its own route so werkzeug's URL map dispatches them directly
 
-@app.route("/c/<channel>", objs=True, methods=["DELETE", "GET", "POST", "PUT"])
-def _channel(o: App.Objs, channel: str) -> Response:
-    return handler(o.server.state, channel)
+
+@app.route("/c/<channel>", objs=True, methods=["GET"])
+def _channel_read(o: App.Objs, channel: str) -> Response:
+    # werkzeug also routes HEAD to GET views, but a HEAD must not consume the channel's data
+    if (method := request.method) == "HEAD":
+        _LOGGER.warning("404: bad method: %s", method)
+        return plaintext(f"Unknown method: {method}", status=404)
+    return handler(read, o.server.state, channel)
+
+
+@app.route("/c/<channel>", objs=True, methods=["POST", "PUT"])
+def _channel_write(o: App.Objs, channel: str) -> Response:
+    return handler(write, o.server.state, channel)
+
+
+@app.route("/c/<channel>", objs=True, methods=["DELETE"])
+def _channel_delete(o: App.Objs, channel: str) -> Response:
+    return handler(delete, o.server.state, channel)
 
 
 @app.route("/q/<channel>", objs=True)
@@ -248,10 +371,13 @@ def _log_config(conf: LogConfig) -> Path:
     fmt = CuteFormatter(log.FORMAT, log.DATEFMT, colored=conf.colored)
     fh = FileHandler(log_file, mode="a")
     stream = StreamHandler()
-    root = getLogger()
     for i in (fh, stream):
         i.setFormatter(fmt)
-        root.addHandler(i)
+    # Request threads only enqueue records; a listener thread writes them, batching file writes while busy
+    buffered = MemoryHandler(_LOG_BUFFER, flushLevel=ERROR, target=fh, flushOnClose=True)
+    root = getLogger()
+    root.addHandler(qh := _QueueHandler(buffered, stream))
+    qh.start()
     # Set level
     lvl: int = log.level(conf.verbose)
     root.setLevel(lvl)
@@ -1 +1,3 @@
-from .channel import handler, query
+from .channel import handler, delete, query
+from .write import write
+from .read import read
@@ -1,7 +1,7 @@
 from __future__ import annotations
 from typing import TYPE_CHECKING, cast
-from collections import deque
 from logging import getLogger
+import zlib
 
 from flask import Response, request
 
@@ -14,65 +14,112 @@ from ...shared import (
     TRACE,
     LFS,
 )
-from ..util import MIN_VERSION, MAX_SIZE_SOFT, plaintext
+from ..util import BAD_VERSION_MSG, MIN_VERSION, MAX_SIZE_SOFT, plaintext, remote_addr
 from .util import log_response, log_params
 
 if TYPE_CHECKING:
     from collections.abc import Sequence
+    from .util import Error
     from ..server import Stream
     from ..server import State
+    from ..server.state import UnlockedState
 
 
 _LOG: str = "read"
+_LOGGER = getLogger(_LOG)
+_GZIP_MIN: int = 1024
 
 
-def _check_if_aio(s: Stream, args: DownloadRequestParams) -> Response | None:
+def _check_if_aio(s: Stream, args: DownloadRequestParams) -> Error | None:
     if not args.delete or args.version == WEB_VERSION:
         mode = "web client" if args.delete else "peek"
         if args.stream_id is not None:
-            return plaintext("Stream ID not allowed when using {mode}.", DownloadEC.forbidden)
+            return "Stream ID not allowed when using {mode}.", DownloadEC.forbidden
         if not s.new:
-            return plaintext("Another client has already connected to this pipe.", DownloadEC.in_use)
+            return "Another client has already connected to this pipe.", DownloadEC.in_use
         if not s.upload_complete:
             if s.full():
                 msg = f"Must wait until uploader completes upload when using {mode}"
-                return plaintext(msg, DownloadEC.wait)
+                return msg, DownloadEC.wait
             msg = f"Too much data to read all at once: when using {mode}; data can only be read all at once."
-            return plaintext(msg, DownloadEC.cannot_peek)
+            return msg, DownloadEC.cannot_peek
     return None
 
 
 # pylint: disable=too-many-return-statements
-def _read_error_check(s: Stream | None, args: DownloadRequestParams) -> Response | None:
+def _read_error_check(s: Stream | None, args: DownloadRequestParams) -> Error | None:
     """
-    :return: A response if the data in s should not be returned due to an error, else None
+    :return: The message and status to respond with if the data in s should not be returned, else None
     """
     # No data found?
     if s is None:
-        return plaintext("This channel is currently empty", DownloadEC.no_data)
+        return "This channel is currently empty", DownloadEC.no_data
     # If data must be all at once, handle it
     if err := _check_if_aio(s, args):
         return err
     # Stream ID check
     if args.stream_id is None and s.new is False:
-        return plaintext("Another client has already connected to this pipe.", DownloadEC.in_use)
+        return "Another client has already connected to this pipe.", DownloadEC.in_use
     if args.stream_id is not None and args.stream_id != s.id_:
-        return plaintext("Stream ID mismatch", DownloadEC.conflict)
+        return "Stream ID mismatch", DownloadEC.conflict
     # Web version cannot handle encryption
     if args.version == WEB_VERSION and s.encrypted:
-        return plaintext("Web version cannot read encrypted data. Use the CLI: pip install rpipe", 422)
+        return "Web version cannot read encrypted data. Use the CLI: pip install rpipe", 422
     # Version comparison; bypass if web version or override requested
     if args.version not in (WEB_VERSION, s.version) and not args.override:
-        return plaintext(f"Override = False. Version should be: {s.version}", DownloadEC.wrong_version)
+        return f"Override = False. Version should be: {s.version}", DownloadEC.wrong_version
     # Not data currently available
     if not s.upload_complete and not s.data:
-        return plaintext("No data available; wait for the uploader to send more", DownloadEC.wait)
+        return "No data available; wait for the uploader to send more", DownloadEC.wait
     # Lock check
     if s.locked and args.delete:
-        return plaintext("This channel is locked and cannot be edited; consider --peek", DownloadEC.locked)
+        return "This channel is locked and cannot be edited; consider --peek", DownloadEC.locked
     return None
 
 
+def _gzip(data: Sequence[bytes]) -> list[bytes]:
+    """
+    Gzip data at the fastest level, without first merging it
+    """
+    c = zlib.compressobj(1, zlib.DEFLATED, 31)  # wbits of 31 selects a gzip container
+    ret = [c.compress(i) for i in data]
+    ret.append(c.flush())
+    return ret
+
+
+def _take(
+    u: UnlockedState, s: Stream, args: DownloadRequestParams, channel: str
+) -> tuple[Sequence[bytes], bool]:
+    """
+    Take the data to send from s, assumes the lock of channel is held
+    :return: The data to send and whether it is the final data of the stream
+    """
+    # Read all at once if required
+    if not args.delete:  # Peek mode (could also be web version)
+        _LOGGER.debug("Reading channel %s in peek mode", channel)
+        u.stats.peek(channel, remote_addr())
+        return tuple(s.data), True
+    if args.version == WEB_VERSION:
+        _LOGGER.debug("Reading channel %s from WEB_VERSION", channel)
+        u.stats.read(channel, remote_addr())
+        del u.streams[channel]  # The stream is never needed again
+        return list(s.data), True
+    # Standard read mode
+    _LOGGER.log(TRACE, "Reading channel %s in standard mode", channel)
+    if s.new:
+        s.new = False
+        u.stats.read(channel, remote_addr())
+    rdata = [s.data.popleft()] if s.data else []  # Ensure at least one packet if available
+    size = total_len(rdata)
+    while s.data and (size + len(s.data[0])) < MAX_SIZE_SOFT:
+        rdata.append(chunk := s.data.popleft())
+        size += len(chunk)
+    if final := s.upload_complete and not s.data:
+        _LOGGER.debug("Channel %s empty and final; removing", channel)
+        del u.streams[channel]
+    return rdata, final
+
+
 @log_response(_LOG)
 def read(state: State, channel: str) -> Response:
     """
@@ -80,42 +127,27 @@ def read(state: State, channel: str) -> Response:
     If web version: Fail if not encrypted, bypass version checks
     Otherwise: Version check
     """
-    log = getLogger(_LOG)
     args = DownloadRequestParams.from_dict(request.args)
-    log_params(log, args)
+    log_params(_LOGGER, args)
     if args.version != WEB_VERSION and (args.version < MIN_VERSION or args.version.invalid()):
-        return plaintext(f"Bad version. Server requires >= {MIN_VERSION}", DownloadEC.illegal_version)
-    with state as u:
+        return plaintext(BAD_VERSION_MSG, DownloadEC.illegal_version)
+    rdata: Sequence[bytes] = ()
+    final: bool = False
+    with state.channel(channel) as u:
         s: Stream | None = u.streams.get(channel, None)
-        if (err := _read_error_check(s, args)) is not None:
-            return err
-        if TYPE_CHECKING:
-            s = cast(Stream, s)  # For type checker
-        # Read all at once if required
-        if not args.delete:  # Peek mode (could also be web version)
-            log.debug("Reading channel %s in peek mode", channel)
-            u.stats.peek(channel)
-            rdata: Sequence[bytes] = tuple(s.data)
-            final = True
-        elif args.version == WEB_VERSION:
-            log.debug("Reading channel %s from WEB_VERSION", channel)
-            u.stats.read(channel)
-            rdata = s.data
-            s.data = deque()
-            final = True
-        # Standard read mode
-        else:
-            log.log(TRACE, "Reading channel %s in standard mode", channel)
-            if s.new:
-                s.new = False
-                u.stats.read(channel)
-            rdata = [s.data.popleft()] if s.data else []  # Ensure at least one packet if available
-            while s.data and (len(s.data[0]) + total_len(rdata)) < MAX_SIZE_SOFT:
-                rdata.append(s.data.popleft())
-            final = s.upload_complete and not s.data
-        if args.delete and final:
-            log.debug("Channel %s empty and final; removing", channel)
-            del u.streams[channel]
-    log.log(TRACE, "Merging %d piece(s) of data; total length: %s", len(rdata), LFS(rdata))
+        if (err := _read_error_check(s, args)) is None:
+            if TYPE_CHECKING:
+                s = cast(Stream, s)  # For type checker
+            rdata, final = _take(u, s, args, channel)
+    if err is not None:
+        return plaintext(*err)
+    _LOGGER.log(TRACE, "Sending %d piece(s) of data; total length: %s", len(rdata), LFS(rdata))
     headers = DownloadResponseHeaders(encrypted=s.encrypted, stream_id=s.id_, final=final).to_dict()
-    return Response(b"".join(rdata), mimetype="application/octet-stream", headers=headers)
+    # Encrypted data is already compressed by the client, so only plaintext is worth compressing
+    if not s.encrypted and "gzip" in request.accept_encodings and total_len(rdata) > _GZIP_MIN:
+        _LOGGER.log(TRACE, "Compressing response with gzip")
+        rdata = _gzip(rdata)
+        headers["Content-Encoding"] = "gzip"
+    headers["Vary"] = "Accept-Encoding"
+    # Send the pieces as is rather than joining them; werkzeug still sets Content-Length for sequences
+    return Response(rdata, mimetype="application/octet-stream", headers=headers)
@@ -2,6 +2,7 @@ from __future__ import annotations
 from logging import getLogger, Logger, DEBUG
 from typing import TYPE_CHECKING
 from dataclasses import fields
+from enum import Enum
 
 from flask import Response
 
@@ -13,6 +14,10 @@ if TYPE_CHECKING:
     _ArgsT = TypeVar("_ArgsT", bound=Callable)
 
 
+# The message and status of an error response; responses are built after releasing the state lock
+Error = tuple[str, Enum | int]
+
+
 def log_params(log: Logger, p: UploadRequestParams | DownloadRequestParams) -> None:
     if not log.isEnabledFor(DEBUG):
         return
@@ -26,10 +31,11 @@ def log_response(log_name: str = "util"):
     A decorator that logs the returned flask Responses to the log log_name
     """
 
+    log = getLogger(log_name)
+
     def decorator(func: Callable[[_ArgsT], Response]) -> Callable[[_ArgsT], Response]:
         def inner(*args, **kwargs) -> Response:
             ret: Response = func(*args, **kwargs)
-            log = getLogger(log_name)
             if log.isEnabledFor(DEBUG):
                 log.debug("Response:")
                 log.debug("  Headers:")
@@ -6,7 +6,7 @@ import logging
 from flask import request
 
 from ...shared import WEB_VERSION, LFS, UploadResponseHeaders, UploadRequestParams, UploadEC
-from ..util import MIN_VERSION, MAX_SIZE_HARD, MAX_SIZE_SOFT, plaintext
+from ..util import BAD_VERSION_MSG, MIN_VERSION, MAX_SIZE_HARD, MAX_SIZE_SOFT, plaintext, remote_addr
 from .util import log_response, log_params
 from ..server import Stream
 
@@ -14,10 +14,12 @@ if TYPE_CHECKING:
     from logging import Logger
     from flask import Response
     from ..server import State
+    from .util import Error
 
 
 DEFAULT_TTL: int = 300
 _LOG = "write"
+_LOGGER = logging.getLogger(_LOG)
 
 
 def _log_pipe_size(log: Logger, s: Stream) -> None:
@@ -27,15 +29,20 @@ def _log_pipe_size(log: Logger, s: Stream) -> None:
         log.debug(msg, LFS(n), LFS(s.capacity), 100 * n / s.capacity)
 
 
-def _put_error_check(s: Stream | None, args: UploadRequestParams) -> Response | None:
+def _put_error_check(s: Stream | None, args: UploadRequestParams) -> Error | None:
+    """
+    :return: The message and status to respond with if args may not be written to s, else None
+    """
     if s is None or s.id_ != args.stream_id:
-        return plaintext("Stream ID mismatch.", UploadEC.conflict)
+        return "Stream ID mismatch.", UploadEC.conflict
     if s.upload_complete:
-        return plaintext("Cannot write to a completed stream.", UploadEC.forbidden)
+        return "Cannot write to a completed stream.", UploadEC.forbidden
     if args.version != s.version and not args.override:
-        return plaintext(f"Override = False. Version should be: {s.version}", UploadEC.wrong_version)
+        return f"Override = False. Version should be: {s.version}", UploadEC.wrong_version
     if s.full():
-        return plaintext("Pipe full; wait for the downloader to download more.", UploadEC.wait)
+        return "Pipe full; wait for the downloader to download more.", UploadEC.wait
+    if s.locked:
+        return "Channel is locked and cannot be edited.", UploadEC.locked
     return None
 
 
@@ -43,11 +50,10 @@ def _put_error_check(s: Stream | None, args: UploadRequestParams) -> Response |
 @log_response(_LOG)
 def write(state: State, channel: str) -> Response:
     args = UploadRequestParams.from_dict(request.args)
-    log = logging.getLogger(_LOG)
-    log_params(log, args)
+    log_params(_LOGGER, args)
     # Version and size check
     if args.version != WEB_VERSION and (args.version < MIN_VERSION or args.version.invalid()):
-        return plaintext(f"Bad version. Server requires >= {MIN_VERSION}", UploadEC.illegal_version)
+        return plaintext(BAD_VERSION_MSG, UploadEC.illegal_version)
     add = request.get_data()
     if len(add) > MAX_SIZE_HARD:
         return plaintext(f"Too much data sent. Max data size: {MAX_SIZE_SOFT}", UploadEC.too_big)
@@ -63,28 +69,32 @@ def write(state: State, channel: str) -> Response:
             upload_complete=args.final,
         )
         headers = UploadResponseHeaders(stream_id=new.id_, max_size=MAX_SIZE_SOFT)
-        with state as u:
-            if (existing := u.streams.get(channel, None)) is not None and existing.locked:
-                return plaintext("Channel is locked and cannot be edited.", UploadEC.locked)
-            u.streams[channel] = new
-            u.stats.write(channel)
+        with state.channel(channel) as u:
+            existing = u.streams.get(channel, None)
+            if not (locked := existing is not None and existing.locked):
+                u.streams[channel] = new
+                u.stats.write(channel, remote_addr())
+                state.wake_pruner(new.expire)
+        if locked:
+            return plaintext("Channel is locked and cannot be edited.", UploadEC.locked)
         return plaintext("", 201, headers=headers.to_dict())
     # Continuing an existing stream, stream ID should be present
     if args.stream_id is None:
         return plaintext("PUT request missing stream id", UploadEC.stream_id)
-    with state as unlocked:
+    with state.channel(channel) as unlocked:
         s: Stream | None = unlocked.streams.get(channel, None)
-        if (err := _put_error_check(s, args)) is not None:
-            return err
-        if TYPE_CHECKING:
-            s = cast(Stream, s)  # For type checker
-        if s.locked:
-            return plaintext("Channel is locked and cannot be edited.", UploadEC.locked)
-        s.upload_complete = args.final
-        if add:
-            s.data.append(add)
-            _log_pipe_size(log, s)
-        if args.ttl is not None:
-            s.ttl = args.ttl
-        headers = UploadResponseHeaders(stream_id=s.id_, max_size=MAX_SIZE_SOFT)
+        if (err := _put_error_check(s, args)) is None:
+            if TYPE_CHECKING:
+                s = cast(Stream, s)  # For type checker
+            s.upload_complete = args.final
+            if add:
+                s.data.append(add)
+                _log_pipe_size(_LOGGER, s)
+            if args.ttl is not None:
+                s.ttl = args.ttl
+                state.wake_pruner(unlocked.streams.schedule(channel))
+    if err is not None:
+        return plaintext(*err)
+    # The stream ID was verified to match inside the lock
+    headers = UploadResponseHeaders(stream_id=args.stream_id, max_size=MAX_SIZE_SOFT)
     return plaintext("", 202, headers=headers.to_dict())
@@ -1,11 +1,15 @@
+from __future__ import annotations
+from typing import TYPE_CHECKING
 from dataclasses import fields
 from pathlib import Path
 import argparse
 
 from ..shared import __version__
-from .app import ServerConfig, LogConfig, serve
 from .util import MIN_VERSION
 
+if TYPE_CHECKING:
+    from argparse import Namespace
+
 
 def cli() -> None:
     parser = argparse.ArgumentParser()
@@ -29,6 +33,18 @@ def cli() -> None:
         help="SSH ed25519 public keys to accept for admin access",
     )
     parser.add_argument("-F", "--favicon", type=Path, help="The favicon file, if desired")
+    parser.add_argument(
+        "-t",
+        "--threads",
+        type=int,
+        default=8,
+        help="The number of threads waitress will use to serve requests; raise for many concurrent clients",
+    )
+    parser.add_argument(
+        "--trusted-proxy",
+        default=None,
+        help="The address of a reverse proxy (such as 127.0.0.1) whose X-Forwarded headers waitress trusts",
+    )
     log_g = parser.add_argument_group("Logging")
     log_g.add_argument(
         "-l", "--log-file", type=Path, default=None, help="The log file to append to, if desired"
@@ -43,6 +59,16 @@ def cli() -> None:
     )
     log_g.add_argument("-C", "--colored", action="store_true", help="Enable color in the log output")
     parser.add_argument("--debug", action="store_true", help="Run the server in debug mode")
-    ns = parser.parse_args()
+    _serve(parser.parse_args())
+
+
+def _serve(ns: Namespace) -> None:
+    """
+    We import app after parsing arguments because
+    it is slow, and not necessary for --help or --version
+    """
+    # pylint: disable=import-outside-toplevel
+    from .app import ServerConfig, LogConfig, serve
+
     gen = lambda C: C(**{i: getattr(ns, i) for i in (k.name for k in fields(C))})
     serve(gen(ServerConfig), gen(LogConfig), ns.favicon)
@@ -2,9 +2,9 @@ from __future__ import annotations
 from typing import TYPE_CHECKING
 from logging import getLogger
 from threading import Thread
-from time import sleep
 
 from ...shared import TRACE
+from .state import ServerShutdown, Streams
 
 if TYPE_CHECKING:
     from .state import State
@@ -23,16 +23,17 @@ class PruneThread(Thread):
         log = getLogger("Prune Thread")
         log.info("Starting prune loop")
         while True:
-            log.log(TRACE, "Acquiring state lock")
-            with self._state as rw_state:
-                if rw_state.shutdown:
-                    log.debug("Quitting, state is shutdown")
-                    return
-                log.log(TRACE, "Checking for expired streams")
-                expired = [i for i, k in rw_state.streams.items() if k.expired()]
-                log.log(TRACE, "Pruning %d expired streams", len(expired))
-                for i in expired:
-                    log.info("Pruning expired channel %s", i)
-                    del rw_state.streams[i]
-            log.log(TRACE, "Sleeping for 5 seconds")
-            sleep(5)  # Wait a few seconds before checking again
+            log.log(TRACE, "Checking for expired streams")
+            deadline: float | None = None
+            try:
+                for i in range(Streams.SHARDS):  # Only lock one shard at a time
+                    with self._state.shard(i) as rw_state:
+                        for name in rw_state.streams.prune(i):
+                            log.info("Pruned expired channel %s", name)
+                        if (d := rw_state.streams.next_deadline(i)) is not None:
+                            deadline = d if deadline is None else min(d, deadline)
+            except ServerShutdown:
+                log.debug("Quitting, state is shutdown")
+                return
+            log.log(TRACE, "Sleeping until the next stream expires")
+            self._state.wait_for_pruner(deadline)
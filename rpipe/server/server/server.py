@@ -44,6 +44,7 @@ class Server(Singleton):
             if u.shutdown:
                 raise RuntimeError("Server already shut down")
             u.shutdown = True
+            self.state.wake_pruner(float("-inf"))  # So the prune thread notices the shutdown
             log.info("Removing atexit shutdown registration")
             atexit.unregister(self.shutdown)
             if self._state_file is not None:
@@ -1,20 +1,31 @@
 from __future__ import annotations
 from logging import getLogger, INFO
+from collections.abc import MutableMapping
 from typing import TYPE_CHECKING
-from dataclasses import asdict
+from contextlib import contextmanager
+from dataclasses import fields
 from collections import deque
-from threading import RLock
-import json
+from itertools import chain, count
+from threading import Condition, Lock
+from time import monotonic
+import heapq
+
+import orjson
 
 from ...shared import Stats, Version, restrict_umask, version
+from ..util import json_dumps
 from .stream import Stream
 
 if TYPE_CHECKING:
+    from contextlib import AbstractContextManager
+    from collections.abc import Iterator
     from typing import BinaryIO
     from pathlib import Path
 
 
 MIN_SAVE_STATE_VERSION = Version("8.1.0")
+# Stream fields saved as JSON; data is saved separately, so it is never copied
+_SAVED_FIELDS: tuple[str, ...] = tuple(i.name for i in fields(Stream) if i.name != "data")
 
 
 def _writeline(f: BinaryIO, s: bytes):
@@ -39,6 +50,81 @@ class ServerShutdown(RuntimeError):
     """
 
 
+class Streams(MutableMapping[str, Stream]):
+    """
+    A mapping of channel names to streams, split into independent shards by channel name
+    Each shard is guarded by its own lock in State, so a shard may be accessed while others are in use
+    Each shard also keeps a heap of (expire, name, id_) so expired streams can be found without a scan
+    """
+
+    SHARDS: int = 64
+    __slots__ = ("_shards", "_heaps")
+
+    def __init__(self) -> None:
+        self._shards: tuple[dict[str, Stream], ...] = tuple({} for _ in range(self.SHARDS))
+        self._heaps: tuple[list[tuple[float, str, str]], ...] = tuple([] for _ in range(self.SHARDS))
+
+    @classmethod
+    def shard_of(cls, name: str) -> int:
+        return hash(name) % cls.SHARDS
+
+    def prune(self, index: int) -> list[str]:
+        """
+        Remove the expired streams of shard index
+        Heap entries are only hints: streams that were deleted or replaced are skipped, extended ones re-queued
+        Locked streams are dropped from the heap; schedule() them again once unlocked
+        :return: The names of the pruned streams
+        """
+        shard, heap = self._shards[index], self._heaps[index]
+        now = monotonic()
+        ret: list[str] = []
+        while heap and heap[0][0] < now:
+            _, name, id_ = heapq.heappop(heap)
+            if (s := shard.get(name, None)) is None or s.id_ != id_ or s.locked:
+                continue
+            if s.expired():
+                del shard[name]
+                ret.append(name)
+            else:
+                heapq.heappush(heap, (s.expire, name, id_))
+        return ret
+
+    def next_deadline(self, index: int) -> float | None:
+        """
+        :return: The earliest deadline queued in shard index, or None if there is none
+        """
+        return heap[0][0] if (heap := self._heaps[index]) else None
+
+    def schedule(self, name: str) -> float:
+        """
+        Queue the current expiration of stream name; needed whenever it might now expire sooner than queued
+        :return: The deadline queued
+        """
+        index = self.shard_of(name)
+        s = self._shards[index][name]
+        heapq.heappush(self._heaps[index], (s.expire, name, s.id_))
+        return s.expire
+
+    def get(self, key: str, default=None):  # type: ignore[override]
+        return self._shards[self.shard_of(key)].get(key, default)
+
+    def __getitem__(self, key: str) -> Stream:
+        return self._shards[self.shard_of(key)][key]
+
+    def __setitem__(self, key: str, value: Stream) -> None:
+        self._shards[self.shard_of(key)][key] = value
+        self.schedule(key)
+
+    def __delitem__(self, key: str) -> None:
+        del self._shards[self.shard_of(key)][key]
+
+    def __iter__(self) -> Iterator[str]:
+        return chain.from_iterable(self._shards)
+
+    def __len__(self) -> int:
+        return sum(len(i) for i in self._shards)
+
+
 class UnlockedState:
     """
     A class that holds the state of a server
@@ -50,7 +136,7 @@ class UnlockedState:
     _log = getLogger("UnlockedState")
 
     def __init__(self) -> None:
-        self.streams: dict[str, Stream] = {}
+        self.streams = Streams()
         self.shutdown: bool = False
         self.stats = Stats()
 
@@ -76,7 +162,7 @@ class UnlockedState:
         """
         Save the program state (does not save stats)
         Do not call this unless the server is shutdown!
-        Assumes self.RLock is acquired
+        Assumes every lock of the State is acquired
         """
         if not self.shutdown:
             raise RuntimeError("Do save state before shutdown")
@@ -95,22 +181,21 @@ class UnlockedState:
                 f.write(bytes(version) + b"\n")
                 _writeline(f, str(len(self.streams)).encode())
                 for name, s in self.streams.items():
-                    d = asdict(s)
-                    deq = d.pop("data")
-                    _writeline(f, f"{name} {len(deq)} ".encode() + json.dumps(d, default=str).encode())
-                    for i in deq:
+                    d = {i: getattr(s, i) for i in _SAVED_FIELDS}
+                    _writeline(f, f"{name} {len(s.data)} ".encode() + json_dumps(d))
+                    for i in s.data:
                         _writeline(f, i)
 
     def _load(self, file: Path) -> bool:
         self._log.info("Loading %s", file)
-        self.streams = {}
+        self.streams = Streams()
         with file.open("rb") as f:
             if (ver := Version(f.readline()[:-1])) < MIN_SAVE_STATE_VERSION:
                 self._log.error("State version too old: %s", ver)
                 return False
             for _ in range(int(_readline(f))):
                 main = _readline(f).split(b" ", 2)
-                body = json.loads(main[2])
+                body = orjson.loads(main[2])
                 body["version"] = Version(body["version"])
                 body["data"] = deque(_readline(f) for _2 in range(int(main[1])))
                 self.streams[main[0].decode()] = Stream(**body)
@@ -120,12 +205,18 @@ class UnlockedState:
 class State:
     """
     A thread safe wrapper for ServerState
+    Entering the State locks all of it; use channel() to lock just what a single channel needs
+    The locks are not reentrant: never enter the State or a shard while already holding one
     """
 
-    __slots__ = ("_lock", "_log", "_state", "_debug")
+    __slots__ = ("_locks", "_log", "_state", "_debug", "_prune_cv", "_prune_at", "_counter", "_generation")
 
     def __init__(self, debug: bool) -> None:
-        self._lock = RLock()
+        self._locks = tuple(Lock() for _ in range(Streams.SHARDS))
+        self._counter = count()
+        self._generation: int = next(self._counter)
+        self._prune_cv = Condition()
+        self._prune_at: float = float("inf")  # When the prune thread should next wake
         self._log = getLogger("State")
         self._state = UnlockedState()
         self._debug: bool = debug
@@ -134,16 +225,69 @@ class State:
     def debug(self) -> bool:
         return self._debug
 
+    @property
+    def generation(self) -> int:
+        """
+        A value that changes whenever a shard is locked, and thus whenever a stream may have changed
+        Changes made while holding every lock (such as loading the state) are not tracked
+        """
+        return self._generation
+
+    @contextmanager
+    def shard(self, index: int) -> Iterator[UnlockedState]:
+        """
+        Acquire only the lock guarding shard index and return the state; will fail if the server is shutdown
+        The caller may only access the streams in the given shard, and the stats of their channels
+        """
+        with self._locks[index]:
+            if self._state.shutdown:
+                self._log.error("Lock acquired, but server is shut down")
+                raise ServerShutdown()
+            self._generation = next(self._counter)
+            yield self._state
+
+    def channel(self, name: str) -> AbstractContextManager[UnlockedState]:
+        """
+        Acquire only the lock guarding channel name and return the state; will fail if the server is shutdown
+        The caller may only access the given channel's stream and stats
+        """
+        return self.shard(Streams.shard_of(name))
+
+    def wake_pruner(self, deadline: float) -> None:
+        """
+        Notify the prune thread of a stream deadline if it is earlier than the prune thread would otherwise wake
+        """
+        with self._prune_cv:
+            if deadline < self._prune_at:
+                self._prune_at = deadline
+                self._prune_cv.notify()
+
+    def wait_for_pruner(self, deadline: float | None) -> None:
+        """
+        Block the prune thread until deadline (forever if None), or until an earlier one is given to wake_pruner
+        """
+        with self._prune_cv:
+            if deadline is not None:  # _prune_at may have been lowered by deadlines added during the prune
+                self._prune_at = min(self._prune_at, deadline)
+            while (timeout := self._prune_at - monotonic()) > 0:
+                self._prune_cv.wait(None if timeout == float("inf") else timeout)
+            self._prune_at = float("inf")
+
     def __enter__(self) -> UnlockedState:
         """
-        Acquire the lock and return the state; will fail if the server is shutdown
+        Acquire every lock and return the state; will fail if the server is shutdown
         """
-        self._lock.acquire()
+        for i in self._locks:
+            i.acquire()
         if self._state.shutdown:
             self._log.error("Lock acquired, but server is shut down")
-            self._lock.release()
+            self._release()
             raise ServerShutdown()
         return self._state
 
     def __exit__(self, exc_type, exc_val, exc_tb):
-        self._lock.release()
+        self._release()
+
+    def _release(self) -> None:
+        for i in reversed(self._locks):
+            i.release()
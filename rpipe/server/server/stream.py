@@ -1,15 +1,17 @@
 from __future__ import annotations
 from dataclasses import dataclass, field
 from datetime import datetime, timedelta
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, cast
+from collections import deque
+from time import monotonic
 import random
 import string
 
 from ...shared import QueryResponse, total_len
 
 if TYPE_CHECKING:
+    from collections.abc import Iterable
     from ...version import Version
-    from collections import deque
 
 
 CHARSET = string.ascii_lowercase + string.ascii_uppercase + string.digits
@@ -20,6 +22,28 @@ def _uid() -> str:
     return "".join(random.choices(CHARSET, k=32))  # nosec B311
 
 
+class _Data(deque):
+    """
+    A deque of bytes that keeps a running total of its size, so measuring it is O(1)
+    Only append and popleft keep the total up to date; do not modify it in other ways
+    """
+
+    __slots__ = ("nbytes",)
+
+    def __init__(self, data: Iterable[bytes] = ()) -> None:
+        super().__init__(data)
+        self.nbytes: int = total_len(self)
+
+    def append(self, x: bytes) -> None:
+        super().append(x)
+        self.nbytes += len(x)
+
+    def popleft(self) -> bytes:
+        ret: bytes = super().popleft()
+        self.nbytes -= len(ret)
+        return ret
+
+
 @dataclass(kw_only=True)
 class Stream:  # pylint: disable=too-many-instance-attributes
     """
@@ -38,7 +62,8 @@ class Stream:  # pylint: disable=too-many-instance-attributes
     id_: str = field(default_factory=_uid)
 
     def __post_init__(self) -> None:
-        self.expire: datetime  # Set by __setattr__
+        self.data = _Data(self.data)
+        self.expire: float  # Monotonic deadline, set by __setattr__
         self._capacity: int = _PIPE_MAX_BYTES
         self._constants = ("encrypted", "version", "id_", "_constants")
 
@@ -53,19 +78,19 @@ class Stream:  # pylint: disable=too-many-instance-attributes
         super().__setattr__(key, value)
         if hasattr(self, "ttl"):  # hasattr b/c we might not during init
             # pylint: disable=attribute-defined-outside-init
-            super().__setattr__("expire", datetime.now() + timedelta(seconds=self.ttl))
+            super().__setattr__("expire", monotonic() + self.ttl)
 
     def expired(self) -> bool:
         """
         Return true if the stream is expired and unlocked
         """
-        return not self.locked and self.expire < datetime.now()
+        return not self.locked and self.expire < monotonic()
 
     def __len__(self) -> int:
         """
         :return: The number of bytes in the pipe
         """
-        return total_len(self.data)
+        return cast(_Data, self.data).nbytes
 
     def full(self) -> bool:
         """
@@ -81,6 +106,6 @@ class Stream:  # pylint: disable=too-many-instance-attributes
             size=len(self),
             encrypted=self.encrypted,
             version=self.version,
-            expiration=self.expire,
+            expiration=datetime.now() + timedelta(seconds=self.expire - monotonic()),
             locked=self.locked,
         )
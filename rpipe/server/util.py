@@ -1,8 +1,10 @@
 from __future__ import annotations
-from typing import TYPE_CHECKING
-from json import dumps
+from typing import TYPE_CHECKING, Any
+from collections import deque
 
-from flask import Response
+from flask.json.provider import JSONProvider
+from flask import Response, request, g
+import orjson
 
 from ..shared import MAX_SOFT_SIZE_MIN, Version
 
@@ -12,6 +14,7 @@ if TYPE_CHECKING:
 
 
 MIN_VERSION = Version("6.3.0")
+BAD_VERSION_MSG: str = f"Bad version. Server requires >= {MIN_VERSION}"
 
 # Maximum size of a request
 # Note: The soft limit is soft to allow overhead of encryption headers and such
@@ -24,7 +27,27 @@ def total_len(x: Sequence[bytes]) -> int:
     return sum(len(i) for i in x)
 
 
-def plaintext(msg: str, status: Enum | int = 200, **kwargs) -> Response:
+def full_path() -> str:
+    """
+    :return: The current request's path and query string, computed once per request
+    """
+    if (ret := g.get("full_path", None)) is None:
+        g.full_path = ret = request.full_path.strip("?")
+    return ret
+
+
+def remote_addr() -> str:
+    """
+    :return: A description of the current request's client, computed once per request
+    """
+    if (ret := g.get("remote_addr", None)) is None:
+        addr = request.remote_addr
+        xf = request.headers.get("X-Forwarded-For")
+        g.remote_addr = ret = f"{addr} / X-Forwarded-For: {xf}" if xf else str(addr)
+    return ret
+
+
+def plaintext(msg: str | bytes, status: Enum | int = 200, **kwargs) -> Response:
     """
     Return a plain text Response containing the arguments
     """
@@ -32,5 +55,28 @@ def plaintext(msg: str, status: Enum | int = 200, **kwargs) -> Response:
     return Response(msg, status=code, mimetype="text/plain", **kwargs)
 
 
+def _json_default(o: object) -> list | str:
+    return list(o) if isinstance(o, deque) else str(o)
+
+
+def json_dumps(js) -> bytes:
+    """
+    Serialize js to JSON; deques are serialized as lists, other types orjson does not support as strings
+    """
+    return orjson.dumps(js, default=_json_default)
+
+
 def json_response(js) -> Response:
-    return Response(dumps(js, default=str), status=200, mimetype="application/json")
+    return Response(json_dumps(js), status=200, mimetype="application/json")
+
+
+class OrJSONProvider(JSONProvider):
+    """
+    A flask JSON provider backed by orjson, so app.json and jsonify serialize like json_dumps
+    """
+
+    def dumps(self, obj: Any, **kwargs: Any) -> str:
+        return json_dumps(obj).decode()
+
+    def loads(self, s: str | bytes, **kwargs: Any) -> Any:
+        return orjson.loads(s)
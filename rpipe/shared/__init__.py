@@ -7,8 +7,10 @@ from .request_response import (
     DownloadResponseHeaders,
     QueryResponse,
     AdminMessage,
+    KEY_HINT_HEADER,
+    ZSTD_MIMETYPE,
 )
 from .error_code import UploadEC, DownloadEC, DeleteEC, QueryEC, AdminEC
-from .util import restrict_umask, remote_addr, total_len
+from .util import restrict_umask, key_fingerprint, total_len
 from .stats import AdminStats, Stats
 from .log import TRACE, LFS
@@ -63,3 +63,4 @@ class AdminEC(Enum):
     invalid: int = 400
     unauthorized: int = 401
     illegal_version: int = 426
+    backoff: int = 429  #          Too many recent failures from this address, try again later
@@ -13,6 +13,10 @@ if TYPE_CHECKING:
 
 # Servers may not have a MAX_SOFT_SIZE less than this
 MAX_SOFT_SIZE_MIN: int = 8 * (1000**2)
+# Header admin clients use to say which key they signed with; the server still verifies the signature
+KEY_HINT_HEADER: str = "Key-Fingerprint"
+# Mimetype of zstd compressed admin responses; clients ask for it via the Accept header
+ZSTD_MIMETYPE: str = "application/zstd"
 
 
 @dataclass
@@ -22,7 +26,11 @@ class _ToDict:
 
 
 def _get_bool(d: dict[str, str], name: str, default: bool) -> bool:
-    return d.get(name, str(default)) == "True"
+    return default if (got := d.get(name, None)) is None else got == "True"
+
+
+def _get_version(d: dict[str, str]) -> Version:
+    return WEB_VERSION if (got := d.get("version", None)) is None else Version(got)
 
 
 def _get_int_or_none(d: dict[str, str], name: str) -> int | None:
@@ -52,7 +60,7 @@ class UploadRequestParams(_ToDict):
     @classmethod
     def from_dict(cls, d: MultiDict[str, str]) -> UploadRequestParams:
         return cls(
-            version=Version(d.get("version", WEB_VERSION.str)),
+            version=_get_version(d),
             encrypted=_get_bool(d, "encrypted", False),
             final=_get_bool(d, "final", False),
             override=_get_bool(d, "override", False),
@@ -71,7 +79,7 @@ class DownloadRequestParams(_ToDict):
     @classmethod
     def from_dict(cls, d: MultiDict[str, str]) -> DownloadRequestParams:
         return cls(
-            version=Version(d.get("version", WEB_VERSION.str)),
+            version=_get_version(d),
             delete=_get_bool(d, "delete", False),
             override=_get_bool(d, "override", False),
             stream_id=d.get("stream-id", None),
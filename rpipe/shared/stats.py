@@ -1,15 +1,16 @@
 from __future__ import annotations
 from dataclasses import dataclass, field
-from collections import defaultdict
+from collections import defaultdict, deque
 from typing import TYPE_CHECKING
 from datetime import datetime
 
-from .util import remote_addr
-
 if TYPE_CHECKING:
     from pathlib import Path
 
 
+ADMIN_HISTORY: int = 10_000  # Only the most recent admin requests are kept
+
+
 @dataclass(kw_only=True)
 class ChannelStats:
     peeks: defaultdict[str, int] = field(default_factory=lambda: defaultdict(int))
@@ -34,20 +35,20 @@ class AdminStats:
 class Stats:
     start: datetime = field(default_factory=datetime.now)
     channels: defaultdict[str, ChannelStats] = field(default_factory=lambda: defaultdict(ChannelStats))
-    admin: list[AdminStats] = field(default_factory=list)
+    admin: deque[AdminStats] = field(default_factory=lambda: deque(maxlen=ADMIN_HISTORY))
 
-    def peek(self, channel: str) -> None:
-        self._update(channel, "peeks")
+    def peek(self, channel: str, host: str) -> None:
+        self._update(channel, host, "peeks")
 
-    def read(self, channel: str) -> None:
-        self._update(channel, "reads")
+    def read(self, channel: str, host: str) -> None:
+        self._update(channel, host, "reads")
 
-    def write(self, channel: str) -> None:
-        self._update(channel, "writes")
+    def write(self, channel: str, host: str) -> None:
+        self._update(channel, host, "writes")
 
-    def delete(self, channel: str) -> None:
-        self._update(channel, "deletes")
+    def delete(self, channel: str, host: str) -> None:
+        self._update(channel, host, "deletes")
 
-    def _update(self, channel: str, name: str) -> None:
-        getattr(self.channels[channel], name)[remote_addr()] += 1
+    def _update(self, channel: str, host: str, name: str) -> None:
+        getattr(self.channels[channel], name)[host] += 1
         self.channels[channel].natime = datetime.now()
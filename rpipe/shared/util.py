@@ -1,18 +1,22 @@
 from __future__ import annotations
 from contextlib import contextmanager
 from typing import TYPE_CHECKING
+from hashlib import sha256
 from os import umask
 
-from flask import request
-
 if TYPE_CHECKING:
+    from cryptography.hazmat.primitives.asymmetric.types import PublicKeyTypes
     from collections.abc import Sequence
 
 
-def remote_addr() -> str:
-    addr = request.remote_addr
-    xf = request.headers.get("X-Forwarded-For")
-    return f"{addr} / X-Forwarded-For: {xf}" if xf else str(addr)
+def key_fingerprint(key: PublicKeyTypes) -> str:
+    """
+    :return: A short fingerprint of key, used as a hint for which key signed an admin request
+    """
+    # pylint: disable=import-outside-toplevel
+    from cryptography.hazmat.primitives.serialization import Encoding, PublicFormat
+
+    return sha256(key.public_bytes(Encoding.OpenSSH, PublicFormat.OpenSSH)).hexdigest()[:16]
 
 
 def total_len(x: Sequence[bytes]) -> int:
@@ -1,9 +1,26 @@
 from __future__ import annotations
-from functools import total_ordering
+from functools import total_ordering, lru_cache
+import re
 
 from .. import __version__
 
 
+_INVALID: tuple[int, ...] = (-1, -1, -1)
+_INVALID_STR: str = "Unable to parse version"
+_VERSION_RE = re.compile(r"(\d+)\.(\d+)\.(\d+)")
+
+
+@lru_cache(maxsize=256)
+def _parse(v: str) -> tuple[str, tuple[int, ...]]:
+    """
+    Clients send one of only a few versions, so we cache the parsed results
+    :return: The version string and tuple, or v and the invalid tuple if v cannot be parsed
+    """
+    if (m := _VERSION_RE.fullmatch(v.strip())) is None:
+        return v, _INVALID
+    return v, (int(m[1]), int(m[2]), int(m[3]))
+
+
 @total_ordering
 class Version:
     """
@@ -12,14 +29,12 @@ class Version:
     Allows invalid versions but marks them as such
     """
 
-    _invalid = (-1, -1, -1)
-    _invalid_str = "Unable to parse version"
+    _invalid = _INVALID
+    _invalid_str = _INVALID_STR
 
     def __init__(self, v: str | bytes):
         try:
-            self.str: str = v if isinstance(v, str) else v.decode()
-            tup = tuple(int(i) for i in self.str.split("."))
-            self.tuple = tup if len(tup) == 3 else self._invalid
+            self.str, self.tuple = _parse(v if isinstance(v, str) else v.decode())
         except ValueError:
             self.str = self._invalid_str
             self.tuple = self._invalid
@@ -37,7 +52,7 @@ class Version:
         return self.tuple < other.tuple
 
     def __eq__(self, other: object):
-        return isinstance(other, Version) and self.str == other.str
+        return self is other or (isinstance(other, Version) and self.str == other.str)
 
 
 version = Version(__version__)
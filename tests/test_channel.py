@@ -0,0 +1,28 @@
+from __future__ import annotations
+from typing import TYPE_CHECKING
+
+import pytest
+
+from rpipe.server.app import app, App
+from rpipe.server.server import Server
+from rpipe.shared import __version__
+
+if TYPE_CHECKING:
+    from collections.abc import Iterator
+    from flask.testing import FlaskClient
+
+
+@pytest.fixture
+def client() -> Iterator[FlaskClient]:
+    server = Server(False, None)
+    app._objs = App.Objs(None, server, None)  # pylint: disable=protected-access
+    yield app.test_client()
+    server.shutdown()
+
+
+def test_head_does_not_consume_data(client: FlaskClient) -> None:
+    assert client.post(f"/c/x?version={__version__}&final=True", data=b"data").status_code == 201
+    assert client.head(f"/c/x?version={__version__}&delete=True").status_code == 404
+    r = client.get(f"/c/x?version={__version__}&delete=True")
+    assert r.status_code == 200
+    assert r.data == b"data"
@@ -0,0 +1,46 @@
+from __future__ import annotations
+import orjson
+
+from rpipe.server.admin.verify import Verify
+from rpipe.server.app import app
+from rpipe.server.server import State
+from rpipe.shared import AdminEC, __version__
+
+
+def test_backoff_after_repeated_failures() -> None:
+    v = Verify([])
+    for _ in range(5):
+        v._failed("addr")  # pylint: disable=protected-access
+    assert v._backoff("addr") > 0  # pylint: disable=protected-access
+    assert v._backoff("other") == 0  # pylint: disable=protected-access
+
+
+def test_backoff_ignores_forwarded_for() -> None:
+    v = Verify([])
+    state = State(False)
+    body = b"\n".join((__version__.encode(), b"sig", orjson.dumps({"body": "", "path": "/", "uid": "00"})))
+    codes = []
+    for i in range(6):
+        headers = {"X-Forwarded-For": f"10.0.0.{i}"}
+        with app.test_request_context(method="POST", data=body, headers=headers):
+            codes.append(v("x", state).status_code)
+    assert codes[:4] == [AdminEC.unauthorized] * 4
+    assert codes[4:] == [AdminEC.backoff] * 2
+
+
+def test_failures_are_bounded() -> None:
+    v = Verify([])
+    for i in range(5000):
+        v._failed(str(i))  # pylint: disable=protected-access
+    assert len(v._failures) == 1024  # pylint: disable=protected-access
+    assert "4999" in v._failures and "0" not in v._failures  # pylint: disable=protected-access
+
+
+def test_long_version_is_truncated() -> None:
+    v = Verify([])
+    state = State(False)
+    body = b"\n".join((b"9" * 1000, b"sig", b"{}"))
+    with app.test_request_context(method="POST", data=body):
+        assert v("x", state).status_code == AdminEC.illegal_version
+    with state as s:
+        assert s.stats.admin[-1].version == "9" * 64
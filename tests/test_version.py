@@ -0,0 +1,14 @@
+from rpipe.shared import Version
+
+
+def test_whitespace_is_ignored() -> None:
+    assert not Version(" 9.5.3").invalid()
+    assert not Version("9.5.3\n").invalid()
+    assert Version("9.5.3\n").tuple == (9, 5, 3)
+
+
+def test_invalid_versions_compare_by_content() -> None:
+    assert Version("1.2").invalid()
+    assert Version("1.2") != Version("1.3")
+    assert Version("1.2") == Version("1.2")
+    assert str(Version("abc")) == "abc"